@@ -6,15 +6,28 @@ import json
 import argparse
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import shutil
 import traceback
 import warnings
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
+import PIL
+from PIL import Image
 from pathlib import Path
 import re
+import hashlib
+import time
+import functools
+import queue
+import threading
+import numpy as np
+import io
+import contextlib
+import socket
+import socketserver
+import stat
+import tempfile
 import torch
-from transformers import CLIPProcessor, CLIPModel
 from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
@@ -28,6 +41,10 @@ load_dotenv()
 device = torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu')
 print(f"Using device: {device}")
 
+# Pillow-SIMD versions carry a ".postN" suffix; stock Pillow decodes and resizes stills without SIMD
+if '.post' not in PIL.__version__:
+    print(f"Using Pillow {PIL.__version__} (install pillow-simd for faster still decoding and resizing)")
+
 # TMDB API key - Read from environment variable
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 if not TMDB_API_KEY:
@@ -37,26 +54,102 @@ if not TMDB_API_KEY:
 TMDB_BASE_URL = 'https://api.themoviedb.org/3'
 TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/original'
 
+# Shared HTTP session so TMDB API and image requests reuse their connections
+SESSION = requests.Session()
+# Retry transient gateway errors with backoff, and keep enough pooled connections for parallel still downloads
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                                      max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+
+# Connect and read timeouts (seconds) for every TMDB request
+HTTP_TIMEOUT = (5, 30)
+
+# CLIP model used unless --model-name overrides it
+DEFAULT_MODEL_NAME = "openai/clip-vit-large-patch14"
+
 # Similarity threshold (0.96 default is stricter)
 SIMILARITY_THRESHOLD = 0.90
 
 # Early stopping threshold (stop processing more stills if a match exceeds this)
 EARLY_STOP_THRESHOLD = 0.96
 
+# Minimum margin above the similarity threshold before stopping early, so borderline scores never end the scan
+EARLY_STOP_MARGIN = 0.05
+
 # Temp directory
 TEMP_DIR = 'temp'
 
 # Output directory for verification images
 VERIFY_DIR = 'verification'
 
+# Height of the still and frame in verification comparison images
+COMPARISON_HEIGHT = 360
+
+# Persistent cache shared by every run: still embeddings and TMDB responses
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'wardarr')
+STILL_CACHE_DIR = os.path.join(CACHE_DIR, 'stills')
+TMDB_CACHE_DIR = os.path.join(CACHE_DIR, 'tmdb')
+ONNX_CACHE_DIR = os.path.join(CACHE_DIR, 'onnx')
+OPENVINO_CACHE_DIR = os.path.join(CACHE_DIR, 'openvino')
+
+# Frame embeddings of fully scanned videos, reused when the same file is matched again.
+# Entries unused for FRAME_CACHE_MAX_AGE seconds (30 days) are pruned; deleting the directory clears it entirely
+FRAME_CACHE_DIR = os.path.join(TEMP_DIR, 'embeds')
+FRAME_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# ONNX Runtime execution providers, fastest first; only the installed ones are used
+ONNX_PROVIDERS = ['TensorrtExecutionProvider', 'CUDAExecutionProvider', 'CPUExecutionProvider']
+
+# How long cached TMDB episode image lists stay valid (24 hours)
+EPISODE_IMAGES_TTL = 24 * 60 * 60
+
+# How long cached TMDB show search results stay valid (7 days); show IDs practically never change
+SHOW_SEARCH_TTL = 7 * 24 * 60 * 60
+
+# Filename patterns, compiled once for bulk scans
+SE_RE = re.compile(r'S(\d+)E(\d+)', re.IGNORECASE)
+SHOW_RE = re.compile(r'^(.+?)(?:\s*\(|\s*-\s*S\d+|\s*S\d+)', re.IGNORECASE)
+YEAR_RE = re.compile(r'\((\d{4})\)')
+EPTITLE_RE = re.compile(r'S\d+E\d+\s*-\s*([^[\]()]+)', re.IGNORECASE)
+ID_RE = re.compile(r'\[(?:tvdbid|imdb)-(\w+)\]', re.IGNORECASE)
+TRAILING_SEPARATORS_RE = re.compile(r'[._]+$')
+SEPARATORS_RE = re.compile(r'[._]+')
+SPECIAL_SUFFIX_RE = re.compile(r'[^\w\s].*')
+UNSAFE_DIRNAME_RE = re.compile(r'[^\w\-_]')
+
 # Frame extraction rate (1 frame per second)
 FRAME_RATE = 1
 
+# Frame batches decoded ahead of the one being embedded
+PREFETCH_BATCHES = 2
+
+# Frames whose 64-bit difference hash is within this many bits of the last kept frame are skipped as duplicates
+DEDUPE_MAX_DISTANCE = 2
+
+# How much of FFmpeg's error output to report when decoding fails
+FFMPEG_ERROR_TAIL_BYTES = 16 * 1024
+
+# Hardware video decoders to try, most preferred first: NVDEC, then VideoToolbox, VA-API, Quick Sync and D3D11VA
+HWACCEL_PREFERENCE = ['cuda', 'videotoolbox', 'vaapi', 'qsv', 'd3d11va']
+
+# Frames embedded per CLIP forward pass for each device type (override with --batch-size)
+BATCH_SIZES = {'cuda': 64, 'mps': 32, 'cpu': 8}
+
+# On CUDA the batch size is sized to this share of the free VRAM instead, within these bounds
+CUDA_MEMORY_FRACTION = 0.7
+CUDA_BATCH_SIZE_RANGE = (4, 128)
+
 def search_tmdb_for_show(show_name, year=None):
     """Search TMDB for a show by name and optionally year."""
     try:
         print(f"Searching TMDB for show: {show_name}" + (f" ({year})" if year else ""))
         
+        # Reuse a recent search for the same show so a batch over a season hits TMDB only once
+        cache_name = "show_" + hashlib.sha1(f"{show_name.lower()}|{year}".encode()).hexdigest()
+        cached = load_cached_json(cache_name, SHOW_SEARCH_TTL)
+        if cached is not None:
+            print(f"Found show: {cached['name']} (ID: {cached['id']}) [cached]")
+            return cached['id']
+        
         query_params = {
             "api_key": TMDB_API_KEY,
             "query": show_name,
@@ -68,7 +161,7 @@ def search_tmdb_for_show(show_name, year=None):
         if year:
             query_params["first_air_date_year"] = year
             
-        response = requests.get(f"{TMDB_BASE_URL}/search/tv", params=query_params)
+        response = SESSION.get(f"{TMDB_BASE_URL}/search/tv", params=query_params, timeout=HTTP_TIMEOUT)
         
         if response.status_code != 200:
             print(f"TMDB API Error: HTTP {response.status_code} - {response.text}")
@@ -84,6 +177,7 @@ def search_tmdb_for_show(show_name, year=None):
         show = data['results'][0]
         tmdb_id = show['id']
         print(f"Found show: {show['name']} (ID: {tmdb_id})")
+        save_cached_json(cache_name, {'id': tmdb_id, 'name': show['name']})
         return tmdb_id
         
     except Exception as e:
@@ -98,31 +192,31 @@ def parse_filename(filepath):
     print(f"Analyzing filename: {filename}")
     
     # Extract season and episode information
-    match = re.search(r'S(\d+)E(\d+)', filename, re.IGNORECASE)
+    match = SE_RE.search(filename)
     
     if match:
         season = int(match.group(1))
         episode = int(match.group(2))
         
         # Try to extract show name before the season/episode info
-        show_match = re.search(r'^(.+?)(?:\s*\(|\s*-\s*S\d+|\s*S\d+)', filename, re.IGNORECASE)
+        show_match = SHOW_RE.search(filename)
         show_name = show_match.group(1).strip() if show_match else "Unknown Show"
         
         # Clean up show name (remove any trailing spaces, dots, or underscores)
-        show_name = re.sub(r'[._]+$', '', show_name.strip())
+        show_name = TRAILING_SEPARATORS_RE.sub('', show_name.strip())
         # Replace dots and underscores with spaces
-        show_name = re.sub(r'[._]+', ' ', show_name).strip()
+        show_name = SEPARATORS_RE.sub(' ', show_name).strip()
         
         # Look for year in parentheses
-        year_match = re.search(r'\((\d{4})\)', filename)
+        year_match = YEAR_RE.search(filename)
         year = year_match.group(1) if year_match else None
         
         # Look for episode title after S00E00 and before brackets/parentheses
-        episode_title_match = re.search(r'S\d+E\d+\s*-\s*([^[\]()]+)', filename, re.IGNORECASE)
+        episode_title_match = EPTITLE_RE.search(filename)
         episode_title = episode_title_match.group(1).strip() if episode_title_match else None
         
         # Check for TVDB or IMDB IDs in brackets
-        id_match = re.search(r'\[(?:tvdbid|imdb)-(\w+)\]', filename, re.IGNORECASE)
+        id_match = ID_RE.search(filename)
         media_id = id_match.group(1) if id_match else None
         
         # Determine TMDB ID by searching for the show
@@ -130,7 +224,7 @@ def parse_filename(filepath):
         if not tmdb_id:
             print(f"WARNING: Could not find TMDB ID for '{show_name}'. Using fallback search.")
             # Try searching with just the first part of the show name (before any special characters)
-            simplified_name = re.sub(r'[^\w\s].*', '', show_name).strip()
+            simplified_name = SPECIAL_SUFFIX_RE.sub('', show_name).strip()
             if simplified_name and simplified_name != show_name:
                 tmdb_id = search_tmdb_for_show(simplified_name)
         
@@ -165,14 +259,21 @@ def get_episode_images(series_id, season, episode):
     """Get episode images from TMDB."""
     try:
         print(f"Getting images for S{season}E{episode} from series ID {series_id}")
-        url = f"{TMDB_BASE_URL}/tv/{series_id}/season/{season}/episode/{episode}/images"
-        response = requests.get(url, params={"api_key": TMDB_API_KEY})
+        cache_name = f"images_{series_id}_s{season}e{episode}"
+        data = load_cached_json(cache_name, EPISODE_IMAGES_TTL)
         
-        if response.status_code != 200:
-            print(f"TMDB API Error: HTTP {response.status_code} - {response.text}")
-            return None
+        if data is not None:
+            print("Using cached episode images")
+        else:
+            url = f"{TMDB_BASE_URL}/tv/{series_id}/season/{season}/episode/{episode}/images"
+            response = SESSION.get(url, params={"api_key": TMDB_API_KEY}, timeout=HTTP_TIMEOUT)
             
-        data = response.json()
+            if response.status_code != 200:
+                print(f"TMDB API Error: HTTP {response.status_code} - {response.text}")
+                return None
+                
+            data = response.json()
+            save_cached_json(cache_name, data)
         
         if 'stills' not in data or len(data['stills']) == 0:
             print(f"No stills found for S{season}E{episode}")
@@ -186,108 +287,397 @@ def get_episode_images(series_id, season, episode):
 
 def download_image(url, output_path):
     """Download an image from URL."""
+    temp_path = None
     try:
         print(f"Downloading image to: {output_path}")
         
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # Download the image
-        response = requests.get(url)
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
+        # Stream the image straight to disk instead of holding the whole body in memory.
+        # It only replaces output_path once complete, so a failed download never leaves a truncated image behind
+        temp_path = f"{output_path}.{os.getpid()}.tmp"
+        with SESSION.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with open(temp_path, 'wb') as f:
+                shutil.copyfileobj(response.raw, f, 64 * 1024)
+                size = f.tell()
+        os.replace(temp_path, output_path)
             
-        print(f"Image saved: {output_path} ({len(response.content)} bytes)")
+        print(f"Image saved: {output_path} ({size} bytes)")
         return output_path
     except Exception as e:
         print(f"Error downloading image: {str(e)}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path) # Drop the partial download
         return None
 
-def extract_frames(video_path, output_dir, frame_rate=1):
-    """Extract frames from video at specified rate."""
+def load_cached_json(name, max_age):
+    """Load a cached TMDB response, or None if it is missing or older than max_age seconds."""
+    cache_path = os.path.join(TMDB_CACHE_DIR, f"{name}.json")
     try:
-        print(f"Extracting frames at {frame_rate} fps...")
+        if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < max_age:
+            with open(cache_path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading cached response: {str(e)}")
+    return None
+
+def save_cached_json(name, data):
+    """Cache a TMDB response on disk, replacing any previous copy atomically."""
+    cache_path = os.path.join(TMDB_CACHE_DIR, f"{name}.json")
+    try:
+        os.makedirs(TMDB_CACHE_DIR, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        print(f"Error saving cached response: {str(e)}")
+
+def still_cache_path(still_url, model_name):
+    """Build the embedding cache path for a TMDB still under a given model."""
+    cache_key = hashlib.sha1(f"{still_url}|{model_name}".encode()).hexdigest()
+    return os.path.join(STILL_CACHE_DIR, f"{cache_key}.npy")
+
+def frame_cache_path(video_path, model_name, frame_rate, keyframes_only, dedupe):
+    """Build the frame embedding cache path for a video, which changes whenever the file is replaced or modified."""
+    if not os.path.exists(video_path):
+        return None
+    video_id = f"{os.path.getsize(video_path)}:{int(os.path.getmtime(video_path))}:{os.path.abspath(video_path)}"
+    cache_key = hashlib.blake2b(f"{video_id}|{model_name}|{frame_rate}|{keyframes_only}|{dedupe}".encode(), digest_size=20).hexdigest()
+    return os.path.join(FRAME_CACHE_DIR, f"{cache_key}.pt")
+
+def load_cached_embeddings(cache_path):
+    """Load cached embeddings onto the device, or None if they have not been cached."""
+    try:
+        if cache_path and os.path.exists(cache_path):
+            embeddings = torch.load(cache_path, map_location=device)
+            # Mark the entry as recently used so pruning keeps it
+            os.utime(cache_path)
+            return embeddings
+    except Exception as e:
+        print(f"Error loading cached embeddings: {str(e)}")
+    return None
+
+def prune_frame_cache():
+    """Delete frame embedding cache entries, including orphans of replaced files, that have not been used recently."""
+    try:
+        cutoff = time.time() - FRAME_CACHE_MAX_AGE
+        for entry in os.scandir(FRAME_CACHE_DIR):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+    except Exception as e:
+        print(f"Error pruning frame embedding cache: {str(e)}")
+
+def save_cached_embeddings(cache_path, embeddings):
+    """Save a dict of embedding tensors to the cache, replacing any previous copy atomically."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        embeddings = {name: tensor.cpu() for name, tensor in embeddings.items()}
+        torch.save(embeddings, temp_path)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        print(f"Error saving cached embeddings: {str(e)}")
+
+def load_cached_still_embedding(cache_path, cache_info):
+    """Memory-map a cached still embedding onto the device, or None if it is missing or was made by another model or preprocessor."""
+    try:
+        info_path = f"{os.path.splitext(cache_path)[0]}.json"
+        if os.path.exists(cache_path) and os.path.exists(info_path):
+            with open(info_path, 'r') as f:
+                if json.load(f) != cache_info:
+                    return None
+            return torch.tensor(np.load(cache_path, mmap_mode='r'), device=device)
+    except Exception as e:
+        print(f"Error loading cached still embedding: {str(e)}")
+    return None
+
+def save_cached_still_embedding(cache_path, embedding, cache_info):
+    """Save a still embedding as float32 .npy with a sidecar JSON describing the model and preprocessor that made it."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        info_path = f"{os.path.splitext(cache_path)[0]}.json"
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, embedding.float().cpu().numpy())
+        os.replace(temp_path, cache_path)
+        with open(temp_path, 'w') as f:
+            json.dump(cache_info, f)
+        os.replace(temp_path, info_path)
+    except Exception as e:
+        print(f"Error saving cached still embedding: {str(e)}")
+
+def detect_ffmpeg_hwaccels():
+    """Return the hardware acceleration methods supported by the installed FFmpeg."""
+    try:
+        process = subprocess.run(['ffmpeg', '-nostdin', '-hide_banner', '-hwaccels'], capture_output=True, text=True)
+        # The first line is the "Hardware acceleration methods:" header
+        return {line.strip() for line in process.stdout.splitlines()[1:] if line.strip()}
+    except Exception:
+        return set()
+
+# Hardware decoders available to FFmpeg, detected once at startup
+FFMPEG_HWACCELS = detect_ffmpeg_hwaccels()
+
+def pick_ffmpeg_hwaccel():
+    """Pick the preferred hardware decoder FFmpeg supports on this machine, or None to decode in software."""
+    for hwaccel in HWACCEL_PREFERENCE:
+        # NVDEC needs an NVIDIA GPU, not just an FFmpeg build that supports it
+        if hwaccel == 'cuda' and not torch.cuda.is_available():
+            continue
+        # Distro FFmpeg builds list VA-API and Quick Sync even on headless or GPU-less Linux hosts without a render node
+        if hwaccel in ('vaapi', 'qsv') and sys.platform.startswith('linux') and not any(Path('/dev/dri').glob('renderD*')):
+            continue
+        if hwaccel in FFMPEG_HWACCELS:
+            return hwaccel
+    return None
+
+FFMPEG_HWACCEL = pick_ffmpeg_hwaccel()
+
+def read_exactly(stream, buffer):
+    """Fill a writable buffer from a stream, returning False if the stream ends first."""
+    filled = 0
+    while filled < len(buffer):
+        count = stream.readinto(buffer[filled:])
+        if not count:
+            return False
+        filled += count
+    return True
+
+def terminate_on_stop(process, stop_event):
+    """Terminate a process as soon as the stop event is set, so a read blocked on its output returns at once."""
+    while process.poll() is None:
+        if stop_event.wait(0.1):
+            process.terminate()
+            return
+
+def frame_dhash(frame):
+    """Compute the 64-bit difference hash of an (H, W, 3) uint8 frame."""
+    gray = frame.float().mean(dim=2)[None, None]
+    small = torch.nn.functional.adaptive_avg_pool2d(gray, (8, 9))[0, 0]
+    bits = (small[:, 1:] > small[:, :-1]).flatten().tolist()
+    return sum(1 << bit_index for bit_index, bit in enumerate(bits) if bit)
+
+def stream_frame_batches(video_path, frame_buffers, frame_rate=1, keyframes_only=False, stop_event=None, dedupe=False, completed_event=None):
+    """Decode frames at the specified rate straight into reusable (B, H, W, 3) uint8 buffers, yielding each filled part with its frame indices."""
+    print(f"Extracting frames at {frame_rate} fps...")
+    
+    # Check if the video file exists
+    if not os.path.exists(video_path):
+        print(f"Error extracting frames: Video file does not exist: {video_path}")
+        return
+    
+    batch_size, frame_size = frame_buffers[0].shape[0], frame_buffers[0].shape[1]
+    frame_bytes = frame_size * frame_size * 3
+    buffer_views = [memoryview(frame_buffer.numpy()).cast('B') for frame_buffer in frame_buffers]
+    
+    # Decode in hardware when the machine supports it, falling back to software decoding if that fails
+    global FFMPEG_HWACCEL
+    hwaccel_attempts = [['-hwaccel', FFMPEG_HWACCEL], []] if FFMPEG_HWACCEL else [[]]
+    
+    # Optionally skip decoding everything but keyframes; the fps filter then repeats the latest keyframe,
+    # so frame N still corresponds to second N / frame_rate of the video
+    skip_args = ['-skip_frame', 'nokey'] if keyframes_only else []
+    
+    for hwaccel_args in hwaccel_attempts:
+        # Have FFmpeg resize the shorter side and center-crop like CLIP's preprocessing, and pipe raw RGB frames to us
+        ffmpeg_cmd = [
+            'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', *hwaccel_args, *skip_args, '-i', video_path,
+            '-vf', f'fps={frame_rate},scale={frame_size}:{frame_size}:force_original_aspect_ratio=increase,crop={frame_size}:{frame_size}',
+            '-pix_fmt', 'rgb24', '-f', 'rawvideo', '-'
+        ]
+        # Errors go to a temporary file rather than a pipe: a damaged file can log more than a pipe buffer holds,
+        # and FFmpeg would then block on stderr while we block on stdout
+        error_log = tempfile.TemporaryFile()
+        process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=error_log, bufsize=1 << 20)
+        if stop_event is not None:
+            threading.Thread(target=terminate_on_stop, args=(process, stop_event), daemon=True).start()
         
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
+        frame_count = 0
+        skipped_count = 0
+        reached_end = False
+        try:
+            # Read each frame directly into its slot of the current buffer, with no intermediate copies,
+            # moving on to the next buffer in the pool once a batch is full
+            filled = 0
+            batch_index = 0
+            buffer_view = buffer_views[0]
+            frame_indices = []
+            last_hash = None
+            while read_exactly(process.stdout, buffer_view[filled * frame_bytes:(filled + 1) * frame_bytes]):
+                frame_count += 1
+                
+                # A frame that barely differs from the last kept one leaves its slot to be overwritten by the next frame
+                if dedupe:
+                    frame_hash = frame_dhash(frame_buffers[batch_index % len(frame_buffers)][filled])
+                    if last_hash is not None and bin(frame_hash ^ last_hash).count('1') <= DEDUPE_MAX_DISTANCE:
+                        skipped_count += 1
+                        continue
+                    last_hash = frame_hash
+                
+                frame_indices.append(frame_count - 1)
+                filled += 1
+                if filled == batch_size:
+                    yield frame_buffers[batch_index % len(frame_buffers)], frame_indices
+                    filled = 0
+                    frame_indices = []
+                    batch_index += 1
+                    buffer_view = buffer_views[batch_index % len(buffer_views)]
+            reached_end = True
+            if filled and not (stop_event is not None and stop_event.is_set()):
+                yield frame_buffers[batch_index % len(frame_buffers)][:filled], frame_indices
+        finally:
+            # Stop FFmpeg right away when the caller no longer needs frames, rather than letting it decode on
+            if not reached_end and process.poll() is None:
+                process.terminate()
+            process.stdout.close()
+            process.wait()
+            # Keep only the end of the log, which has the errors that stopped decoding
+            error_log.seek(max(0, error_log.seek(0, os.SEEK_END) - FFMPEG_ERROR_TAIL_BYTES))
+            stderr = error_log.read().decode(errors='replace')
+            error_log.close()
         
-        # Check if the video file exists
-        if not os.path.exists(video_path):
-            raise FileNotFoundError(f"Video file does not exist: {video_path}")
+        if stop_event is not None and stop_event.is_set():
+            print(f"Stopped frame extraction after {frame_count} frames")
+            return
         
-        # Extract frames using FFmpeg
-        ffmpeg_cmd = f'ffmpeg -i "{video_path}" -vf "fps={frame_rate}" -q:v 2 "{output_dir}/frame-%04d.jpg"'
-        process = subprocess.run(ffmpeg_cmd, shell=True, capture_output=True, text=True)
+        if process.returncode != 0 and frame_count == 0 and hwaccel_args:
+            print(f"Hardware decoding failed, retrying in software: {stderr.strip()}")
+            # Don't try hardware decoding again for later files in this process (e.g. --serve)
+            FFMPEG_HWACCEL = None
+            continue
         
         if process.returncode != 0:
-            print(f"FFmpeg error: {process.stderr}")
-            raise Exception(f"FFmpeg failed with code {process.returncode}: {process.stderr}")
+            print(f"FFmpeg error: {stderr}")
+        elif completed_event is not None:
+            # Tell the caller FFmpeg got through the whole video, so the scan is complete
+            completed_event.set()
+        print(f"Extracted {frame_count} frames")
+        if skipped_count:
+            print(f"Skipped {skipped_count} near-duplicate frames")
+        return
+
+def prefetch_batches(batches, depth=PREFETCH_BATCHES, stop=None):
+    """Run a batch generator on a background thread, keeping up to `depth` batches ready ahead of the consumer."""
+    ready = queue.Queue(maxsize=depth)
+    # Set as soon as the consumer stops; the generator may share it to end its own work early
+    stop = stop if stop is not None else threading.Event()
+    finished = object()
+    
+    def put(item):
+        # Give up as soon as the consumer stops, so a full queue can never block the producer forever
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    break
+            put(finished)
+        except Exception as e:
+            put(e)
+        finally:
+            batches.close()
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def extract_frame(video_path, frame_index, output_path, frame_rate=1):
+    """Extract a single sampled frame, sized for the comparison images."""
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # Get list of extracted frames
-        frame_files = [f for f in os.listdir(output_dir) if f.startswith('frame-')]
-        frame_paths = [os.path.join(output_dir, f) for f in sorted(frame_files)]
+        # Seek to the sampled frame's timestamp and write just that frame, already scaled to the comparison height
+        ffmpeg_cmd = [
+            'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-ss', f'{frame_index / frame_rate:.3f}', '-i', video_path,
+            '-vf', f'scale=-2:{COMPARISON_HEIGHT}', '-frames:v', '1', '-q:v', '5', output_path
+        ]
+        process = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
         
-        if not frame_paths:
-            print("Warning: No frames were extracted")
-            
-        print(f"Extracted {len(frame_paths)} frames")
-        return frame_paths
+        if process.returncode != 0 or not os.path.exists(output_path):
+            raise Exception(f"FFmpeg failed with code {process.returncode}: {process.stderr}")
+        
+        return output_path
     except Exception as e:
-        print(f"Error extracting frames: {str(e)}")
-        traceback.print_exc()
-        return []
-
-def cosine_similarity(a, b):
-    """Calculate cosine similarity between two vectors."""
-    return torch.nn.functional.cosine_similarity(
-        torch.tensor(a, device=device).unsqueeze(0), 
-        torch.tensor(b, device=device).unsqueeze(0)
-    ).item()
+        print(f"Error extracting frame: {str(e)}")
+        return None
 
-def process_batch(batch, still_embedding, processor, model):
-    """Process a batch of frames to calculate similarity with the still."""
-    results = []
+def process_batch(frames, model, pixel_mean, pixel_std, pad_to=None):
+    """Embed a batch of raw RGB frames already on the device, returning their normalized CLIP embeddings."""
+    # Pad a short final batch with blank frames so a compiled model keeps seeing a single input shape
+    frame_count = frames.shape[0]
+    if pad_to and frame_count < pad_to:
+        frames = torch.cat([frames, frames.new_zeros((pad_to - frame_count, *frames.shape[1:]))])
     
-    for frame_path in batch:
-        try:
-            # Load and process the image
-            image = Image.open(frame_path)
-            inputs = processor(images=image, return_tensors="pt")
-            
-            # Move inputs to device
-            inputs = {k: v.to(device) for k, v in inputs.items()}
-            
-            # Get image embedding
-            with torch.no_grad():
-                frame_embedding = model.get_image_features(**inputs).squeeze().cpu().numpy()
-            
-            # Calculate similarity
-            similarity = cosine_similarity(still_embedding, frame_embedding)
-            
-            results.append({
-                "path": frame_path,
-                "similarity": similarity
-            })
-            
-        except Exception as e:
-            print(f"Error processing frame {frame_path}: {str(e)}")
+    # Rescale and normalize the uint8 frames in place into (B, 3, H, W) pixel values.
+    # Permuting the NHWC frames keeps their channels-last memory layout, so no copy is made for the conv
+    pixel_values = frames.permute(0, 3, 1, 2).float()
+    pixel_values = pixel_values.div_(255.0).sub_(pixel_mean).div_(pixel_std).to(model.dtype)
     
-    return results
+    # Embed every frame of the batch in one forward pass
+    with torch.inference_mode():
+        frame_embeddings = model.get_image_features(pixel_values=pixel_values)
+    
+    # Normalize in FP32 so similarities against the stills are plain dot products
+    return torch.nn.functional.normalize(frame_embeddings[:frame_count].float(), dim=-1)
+
+def open_rgb_image(image_path, min_size):
+    """Open an image as RGB, letting the JPEG decoder downscale it as long as both sides stay at least min_size."""
+    image = Image.open(image_path)
+    # draft() only applies to JPEGs and only shrinks by powers of two, so nothing is lost for the later resize
+    image.draft('RGB', (min_size, min_size))
+    return image.convert("RGB")
+
+@functools.lru_cache(maxsize=1)
+def load_comparison_fonts():
+    """Load the label fonts for comparison images once, returning (font, small_font)."""
+    from PIL import ImageFont
+    
+    # Try to load a nice font, fall back to default if not available
+    try:
+        # Use a common font that's likely to be available
+        return ImageFont.truetype("Arial", 14), ImageFont.truetype("Arial", 12)
+    except OSError:
+        # Fall back to default
+        default_font = ImageFont.load_default()
+        return default_font, default_font
 
 def create_comparison_image(still_path, frame_path, output_path, similarity, episode_info=None):
     """Create a side-by-side comparison image for verification."""
+    from PIL import ImageDraw
+    
     try:
         # Open images
-        still_img = Image.open(still_path)
-        frame_img = Image.open(frame_path)
+        still_img = open_rgb_image(still_path, COMPARISON_HEIGHT)
+        frame_img = open_rgb_image(frame_path, COMPARISON_HEIGHT)
         
         # Resize to match height
-        height = 360
+        height = COMPARISON_HEIGHT
         still_width = int((still_img.width / still_img.height) * height)
         frame_width = int((frame_img.width / frame_img.height) * height)
         
-        still_img = still_img.resize((still_width, height), Image.LANCZOS)
-        frame_img = frame_img.resize((frame_width, height), Image.LANCZOS)
+        still_img = still_img.resize((still_width, height), Image.BILINEAR)
+        frame_img = frame_img.resize((frame_width, height), Image.BILINEAR)
         
         # Create new image with both side by side
         comparison = Image.new('RGB', (still_width + frame_width + 10, height + 70), color=(255, 255, 255))
@@ -296,16 +686,7 @@ def create_comparison_image(still_path, frame_path, output_path, similarity, epi
         
         # Add text
         draw = ImageDraw.Draw(comparison)
-        
-        # Try to load a nice font, fall back to default if not available
-        try:
-            # Use a common font that's likely to be available
-            font = ImageFont.truetype("Arial", 14)
-            small_font = ImageFont.truetype("Arial", 12)
-        except:
-            # Fall back to default
-            font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
+        font, small_font = load_comparison_fonts()
         
         draw.text((10, height + 10), f"TMDB Still", fill=(0, 0, 0), font=font)
         draw.text((still_width + 20, height + 10), f"Video Frame - Similarity: {similarity:.3f}", fill=(0, 0, 0), font=font)
@@ -314,9 +695,9 @@ def create_comparison_image(still_path, frame_path, output_path, similarity, epi
         if episode_info and episode_info.get('display_name'):
             draw.text((10, height + 35), f"Episode: {episode_info['display_name']}", fill=(0, 0, 0), font=small_font)
             
-        # Save comparison image
+        # Save comparison image; a fixed quality without the optimize pass keeps the JPEG encode cheap
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        comparison.save(output_path)
+        comparison.save(output_path, quality=90, optimize=False)
         print(f"Saved comparison image: {output_path}")
         return output_path
     except Exception as e:
@@ -324,18 +705,269 @@ def create_comparison_image(still_path, frame_path, output_path, similarity, epi
         traceback.print_exc()
         return None
 
-def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5, strict_mode=False, early_stop_threshold=EARLY_STOP_THRESHOLD, force_still_path=None, model_name_override=None):
+class ImageFeaturesModule(torch.nn.Module):
+    """Expose CLIP's get_image_features as forward() so it can be exported to ONNX."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, pixel_values):
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+class OnnxImageEncoder:
+    """Run an exported CLIP image encoder with ONNX Runtime behind the model's get_image_features interface."""
+    dtype = torch.float32
+    
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_name = session.get_outputs()[0].name
+        self.embed_dim = session.get_outputs()[0].shape[1]
+        # GPU providers can read and write CUDA tensors in place instead of round-tripping through host memory
+        self.binds_cuda = bool({'TensorrtExecutionProvider', 'CUDAExecutionProvider'} & set(session.get_providers()))
+    
+    def get_image_features(self, pixel_values):
+        if not (self.binds_cuda and pixel_values.is_cuda):
+            outputs = self.session.run(None, {self.input_name: pixel_values.float().cpu().numpy()})
+            return torch.from_numpy(outputs[0]).to(pixel_values.device)
+        
+        pixel_values = pixel_values.float().contiguous()
+        image_embeds = torch.empty((pixel_values.shape[0], self.embed_dim), dtype=torch.float32, device=pixel_values.device)
+        device_id = pixel_values.device.index or 0
+        binding = self.session.io_binding()
+        binding.bind_input(self.input_name, 'cuda', device_id, np.float32, tuple(pixel_values.shape), pixel_values.data_ptr())
+        binding.bind_output(self.output_name, 'cuda', device_id, np.float32, tuple(image_embeds.shape), image_embeds.data_ptr())
+        # ONNX Runtime runs on its own stream, so PyTorch's pending work on the input must finish first
+        torch.cuda.current_stream().synchronize()
+        self.session.run_with_iobinding(binding)
+        return image_embeds
+
+def load_onnx_encoder(model, model_name, frame_size, half_precision=True, quantize_int8=False):
+    """Export CLIP's image encoder to ONNX once and open it with ONNX Runtime, or return None if unavailable."""
+    try:
+        import onnxruntime
+    except ImportError:
+        print("onnxruntime is not installed, using PyTorch inference")
+        return None
+    
+    try:
+        # Exported models are cached per model name and input size
+        onnx_key = hashlib.sha1(f"{model_name}|{frame_size}".encode()).hexdigest()
+        onnx_path = os.path.join(ONNX_CACHE_DIR, f"{onnx_key}.onnx")
+        if not os.path.exists(onnx_path):
+            print(f"Exporting image encoder to ONNX: {onnx_path}")
+            os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+            temp_path = f"{onnx_path}.{os.getpid()}.tmp"
+            with torch.no_grad():
+                torch.onnx.export(ImageFeaturesModule(model).cpu(), torch.zeros((1, 3, frame_size, frame_size)), temp_path,
+                                  input_names=['pixel_values'], output_names=['image_embeds'],
+                                  dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}}, opset_version=17)
+            os.replace(temp_path, onnx_path)
+        
+        # On the CPU, optionally run a copy with int8 weights and integer matmuls, quantized once and cached
+        if quantize_int8 and device.type == 'cpu':
+            quantized_path = os.path.join(ONNX_CACHE_DIR, f"{onnx_key}.int8.onnx")
+            if not os.path.exists(quantized_path):
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                print(f"Quantizing ONNX image encoder to int8: {quantized_path}")
+                temp_path = f"{quantized_path}.{os.getpid()}.tmp"
+                quantize_dynamic(onnx_path, temp_path, weight_type=QuantType.QInt8)
+                os.replace(temp_path, quantized_path)
+            onnx_path = quantized_path
+        
+        # TensorRT engines take minutes to build, so keep them on disk next to the ONNX model
+        provider_options = {
+            'TensorrtExecutionProvider': {
+                'trt_engine_cache_enable': True,
+                'trt_engine_cache_path': os.path.join(ONNX_CACHE_DIR, 'trt'),
+                'trt_fp16_enable': half_precision,
+            },
+        }
+        available_providers = onnxruntime.get_available_providers()
+        if device.type == 'cpu':
+            # Honour --cpu even when GPU providers are installed
+            available_providers = ['CPUExecutionProvider']
+        providers = [(provider, provider_options.get(provider, {})) for provider in ONNX_PROVIDERS if provider in available_providers]
+        session = onnxruntime.InferenceSession(onnx_path, providers=providers)
+        print(f"Using ONNX Runtime inference ({', '.join(session.get_providers())})")
+        return OnnxImageEncoder(session)
+    except Exception as e:
+        print(f"Error setting up ONNX Runtime, using PyTorch inference: {str(e)}")
+        traceback.print_exc()
+        return None
+
+class OpenVinoImageEncoder:
+    """Run a compiled OpenVINO CLIP image encoder behind the model's get_image_features interface."""
+    dtype = torch.float32
+    
+    def __init__(self, compiled_model):
+        self.compiled_model = compiled_model
+    
+    def get_image_features(self, pixel_values):
+        outputs = self.compiled_model([pixel_values.float().cpu().numpy()])
+        return torch.tensor(outputs[0], device=pixel_values.device)
+
+def load_openvino_encoder(model, model_name, frame_size):
+    """Convert CLIP's image encoder to OpenVINO IR once and compile it for the CPU, or return None if unavailable."""
+    try:
+        import openvino as ov
+    except ImportError:
+        print("openvino is not installed, using PyTorch inference")
+        return None
+    
+    try:
+        # Converted models are cached per model name and input size
+        ov_key = hashlib.sha1(f"{model_name}|{frame_size}".encode()).hexdigest()
+        ir_path = os.path.join(OPENVINO_CACHE_DIR, f"{ov_key}.xml")
+        if not os.path.exists(ir_path):
+            print(f"Converting image encoder to OpenVINO: {ir_path}")
+            os.makedirs(OPENVINO_CACHE_DIR, exist_ok=True)
+            with torch.no_grad():
+                ov_model = ov.convert_model(ImageFeaturesModule(model).cpu(), example_input=torch.zeros((1, 3, frame_size, frame_size)))
+            # The IR is an .xml graph plus a .bin of weights; move the weights into place before the graph that needs them
+            temp_path = os.path.join(OPENVINO_CACHE_DIR, f"{ov_key}.{os.getpid()}.tmp.xml")
+            ov.save_model(ov_model, temp_path, compress_to_fp16=False)
+            os.replace(f"{os.path.splitext(temp_path)[0]}.bin", f"{os.path.splitext(ir_path)[0]}.bin")
+            os.replace(temp_path, ir_path)
+        
+        # OpenVINO caches the compiled blob itself, so later runs skip graph compilation too.
+        # It would pick BF16 on CPUs that support it, but like the PyTorch CPU path it stays in FP32
+        config = {'CACHE_DIR': os.path.join(OPENVINO_CACHE_DIR, 'blobs'), 'INFERENCE_PRECISION_HINT': 'f32'}
+        compiled_model = ov.Core().compile_model(ir_path, 'CPU', config)
+        print("Using OpenVINO inference (CPU)")
+        return OpenVinoImageEncoder(compiled_model)
+    except Exception as e:
+        print(f"Error setting up OpenVINO, using PyTorch inference: {str(e)}")
+        traceback.print_exc()
+        return None
+
+def load_clip_weights(model_name, local_files_only):
+    """Load CLIP weights with PyTorch's fused SDPA attention, falling back to eager attention where unsupported."""
+    from transformers import CLIPModel
+    
+    try:
+        model = CLIPModel.from_pretrained(model_name, local_files_only=local_files_only, attn_implementation="sdpa")
+        print("Using SDPA attention")
+        return model
+    except ValueError:
+        # Older transformers releases (including the pinned one) have no SDPA path for CLIP and reject the option
+        print("SDPA attention not supported for CLIP by this transformers release, using eager attention")
+        return CLIPModel.from_pretrained(model_name, local_files_only=local_files_only)
+
+@functools.lru_cache(maxsize=None)
+def load_clip_model(model_name, device_name, half_precision=True, backend='torch', quantize_int8=False, compile_model=False):
+    """Load a CLIP model and processor onto the device, ready for inference."""
+    # Imported here so --help and argument errors don't pay for importing transformers
+    from transformers import CLIPProcessor
+    
+    print("Loading CLIP model...")
+    try:
+        # Load from the local HuggingFace cache first so reruns make no network round-trips to the Hub
+        model = load_clip_weights(model_name, local_files_only=True).to(device_name)
+        processor = CLIPProcessor.from_pretrained(model_name, local_files_only=True, use_fast=True)
+        print(f"Using {model_name}")
+    except Exception as e:
+        print(f"Model not available locally: {str(e)}")
+        print("Downloading model...")
+        # Fallback approach if the model has not been cached yet
+        model = load_clip_weights(model_name, local_files_only=False).to(device_name)
+        processor = CLIPProcessor.from_pretrained(model_name, local_files_only=False, use_fast=True)
+        print(f"Fallback successful: loaded {model_name}")
+    
+    # use_fast only selects a fast image processor on transformers releases that ship one for CLIP
+    print(f"Image processor: {type(processor.image_processor).__name__}")
+    
+    # Inference only: disable dropout and other training-time behaviour, and never track gradients
+    model.eval()
+    model.requires_grad_(False)
+    
+    # Hand inference over to ONNX Runtime or OpenVINO when requested and available; the FP32 weights are exported as-is
+    if backend == 'onnx':
+        encoder = load_onnx_encoder(model, model_name, processor.image_processor.crop_size['height'], half_precision, quantize_int8)
+        if encoder is not None:
+            return encoder, processor
+        model = model.to(device_name)
+    elif backend == 'openvino' and device.type != 'cpu':
+        # Running on the CPU would copy every frame batch back off the GPU, so keep the GPU in PyTorch
+        print(f"OpenVINO runs on the CPU only, using PyTorch inference on {device.type}")
+    elif backend == 'openvino':
+        encoder = load_openvino_encoder(model, model_name, processor.image_processor.crop_size['height'])
+        if encoder is not None:
+            return encoder, processor
+        model = model.to(device_name)
+    
+    # Run the model in half precision on GPUs unless disabled; the CPU path stays in FP32.
+    # BF16 keeps FP32's exponent range, so prefer it on CUDA GPUs that support it natively.
+    if half_precision and device.type == 'cuda' and torch.cuda.is_bf16_supported(including_emulation=False):
+        model = model.to(torch.bfloat16)
+        print("Using BF16 inference")
+    elif half_precision and device.type in ('cuda', 'mps'):
+        model = model.half()
+        print("Using FP16 inference")
+    
+    # Optionally quantize the Linear layers to int8 for much faster CPU inference
+    if quantize_int8 and device.type == 'cpu':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print("Using dynamic int8 quantization")
+    
+    # Store the patch embedding convolution channels-last on CUDA, matching the NHWC frames it receives
+    if device.type == 'cuda':
+        model = model.to(memory_format=torch.channels_last)
+    
+    # Frame batches share one shape, so let cuDNN pick the fastest kernels for it
+    if device.type == 'cuda':
+        torch.backends.cudnn.benchmark = True
+    
+    # Optionally compile the vision tower so every fixed-shape frame batch reuses one specialized graph.
+    # It is opt-in because each new process pays a long compile before the first batch
+    if compile_model and hasattr(torch, 'compile') and not (quantize_int8 and device.type == 'cpu'):
+        print("Compiling vision model...")
+        if device.type == 'cuda':
+            model.vision_model = torch.compile(model.vision_model, mode="reduce-overhead", fullgraph=False, dynamic=False)
+        else:
+            # CUDA graphs ("reduce-overhead") only exist on CUDA, so the default mode is used here
+            model.vision_model = torch.compile(model.vision_model, fullgraph=False, dynamic=False)
+    
+    return model, processor
+
+@functools.lru_cache(maxsize=None)
+def cuda_batch_size(model, frame_size):
+    """Pick a CUDA batch size from the free VRAM and the memory a single frame's forward pass needs."""
+    # Measured once per loaded model: later calls in the same process (e.g. --serve) would see VRAM held by the
+    # caching allocator and CUDA graph pools, and a different size would rebuild the compiled graph
+    # Probe the eager vision tower so measuring doesn't compile a graph for a throwaway batch shape
+    vision_model = getattr(model.vision_model, '_orig_mod', model.vision_model)
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    baseline = torch.cuda.memory_allocated()
+    with torch.inference_mode():
+        vision_model(pixel_values=torch.zeros((1, 3, frame_size, frame_size), device=device, dtype=model.dtype))
+    frame_memory = max(torch.cuda.max_memory_allocated() - baseline, 1)
+    
+    free_memory, _ = torch.cuda.mem_get_info()
+    min_batch_size, max_batch_size = CUDA_BATCH_SIZE_RANGE
+    return max(min_batch_size, min(max_batch_size, int(free_memory * CUDA_MEMORY_FRACTION / frame_memory)))
+
+def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5, strict_mode=False, early_stop_threshold=EARLY_STOP_THRESHOLD, force_still_path=None, model_name_override=None, batch_size=None, early_exit=True, half_precision=True, keyframes_only=False, backend='torch', quantize_int8=False, verify_all=False, dedupe=True, compile_model=False, verbose=False):
     """Main function to process a media file."""
     try:
-        import time
         start_time = time.time()
         
         print(f"Processing file: {media_path}")
         print(f"Using similarity threshold: {threshold}")
-        print(f"Early stopping threshold: {early_stop_threshold}")
+        if early_exit:
+            # Never stop scanning on a score that is only just above the match threshold
+            if early_stop_threshold < threshold + EARLY_STOP_MARGIN:
+                early_stop_threshold = round(threshold + EARLY_STOP_MARGIN, 4)
+            print(f"Early stopping threshold: {early_stop_threshold}")
+        else:
+            print("Early stopping: disabled")
         print(f"Maximum stills to process: {max_stills}")
         print(f"Strict mode: {strict_mode}")
         
+        if keyframes_only:
+            print("Decoding keyframes only")
+        
         # Parse filename to extract metadata
         file_info = parse_filename(media_path)
         
@@ -350,43 +982,79 @@ def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5,
         file_name_without_ext = os.path.splitext(file_basename)[0]
         
         # Create a safe directory name
-        safe_dirname = re.sub(r'[^\w\-_]', '_', file_name_without_ext)
+        safe_dirname = UNSAFE_DIRNAME_RE.sub('_', file_name_without_ext)
         verify_path = os.path.join(VERIFY_DIR, safe_dirname)
         os.makedirs(verify_path, exist_ok=True)
         
-        # Extract frames from video
-        frames_dir = os.path.join(TEMP_DIR, safe_dirname + "_frames")
-        frame_paths = extract_frames(media_path, frames_dir, FRAME_RATE)
+        # Fetch the episode's stills list from TMDB in the background while the model loads
+        if not force_still_path:
+            metadata_executor = ThreadPoolExecutor(max_workers=1)
+            episode_images_future = metadata_executor.submit(get_episode_images, file_info['tmdbId'], file_info['season'], file_info['episode'])
+            metadata_executor.shutdown(wait=False) # The submitted fetch still runs; no further work is queued
         
-        if len(frame_paths) == 0:
-            print("Failed to extract frames from video")
-            return False
+        # Initialize CLIP model (loaded once per model and device, then reused)
+        MODEL_NAME = model_name_override if model_name_override else DEFAULT_MODEL_NAME
+        model, processor = load_clip_model(MODEL_NAME, str(device), half_precision, backend, quantize_int8, compile_model)
         
-        # Initialize CLIP model
-        print("Loading CLIP model...")
-        # Define the model name to use
-        MODEL_NAME = model_name_override if model_name_override else "openai/clip-vit-large-patch14"
-        try:
-            model = CLIPModel.from_pretrained(MODEL_NAME, force_download=False).to(device)
-            processor = CLIPProcessor.from_pretrained(MODEL_NAME, force_download=False, use_fast=False)
-            print(f"Using {MODEL_NAME} with standard image processor (not fast)")
-        except Exception as e:
-            print(f"Error loading model: {str(e)}")
-            print("Trying alternate loading approach...")
-            # Fallback approach if the first attempt fails
-            model = CLIPModel.from_pretrained(MODEL_NAME, local_files_only=False).to(device)
-            processor = CLIPProcessor.from_pretrained(MODEL_NAME, local_files_only=False, use_fast=False)
-            print(f"Fallback successful: loaded {MODEL_NAME}")
-            
-        # Process the specified number of stills
-        max_similarity = 0.0
-        best_match_frame = None
-        best_match_still = None
-        best_match_still_path = None
+        # Embeddings drift slightly between backends and precisions (thresholds were tuned against FP32),
+        # so each combination gets its own cached still and frame embeddings
+        if isinstance(model, OnnxImageEncoder):
+            embedding_backend = 'onnx'
+            embedding_dtype = 'float16' if half_precision and 'TensorrtExecutionProvider' in model.session.get_providers() else 'float32'
+        elif isinstance(model, OpenVinoImageEncoder):
+            embedding_backend = 'openvino'
+            embedding_dtype = str(model.compiled_model.get_property('INFERENCE_PRECISION_HINT'))
+        else:
+            embedding_backend = 'torch'
+            embedding_dtype = str(model.dtype).replace('torch.', '')
+        embedding_model_name = f"{MODEL_NAME}|{embedding_backend}|{embedding_dtype}"
+        if quantize_int8 and device.type == 'cpu' and not isinstance(model, OpenVinoImageEncoder):
+            embedding_model_name = f"{embedding_model_name}|int8"
         
-        # For strict mode, track matches for each still
-        still_matches = []
+        # Frames are fed to the model at its native input size and normalized with its mean/std,
+        # so the processor is only needed for the stills
+        frame_size = processor.image_processor.crop_size['height']
+        pixel_mean = torch.tensor(processor.image_processor.image_mean, device=device).view(1, 3, 1, 1)
+        pixel_std = torch.tensor(processor.image_processor.image_std, device=device).view(1, 3, 1, 1)
         
+        # Cached still embeddings are only reused when they came from the same model, backend, precision and preprocessing
+        still_cache_info = {
+            'model': embedding_model_name,
+            'backend': embedding_backend,
+            'dtype': embedding_dtype,
+            'crop_size': frame_size,
+            'image_mean': list(processor.image_processor.image_mean),
+            'image_std': list(processor.image_processor.image_std),
+        }
+        
+        # Pick a batch size suited to the device unless one was given explicitly; on CUDA it fills the free VRAM
+        if not batch_size:
+            if device.type == 'cuda' and not isinstance(model, (OnnxImageEncoder, OpenVinoImageEncoder)):
+                batch_size = cuda_batch_size(model, frame_size)
+            else:
+                batch_size = BATCH_SIZES.get(device.type, BATCH_SIZES['cpu'])
+        print(f"Batch size: {batch_size}")
+        
+        # Warm up the compiled vision tower with one dummy batch so compilation is not paid inside the frame loop.
+        # Every frame batch is then padded to this same shape so the compiled graph is never rebuilt
+        compiled_model = hasattr(getattr(model, 'vision_model', None), '_orig_mod')
+        if compiled_model:
+            try:
+                with torch.inference_mode():
+                    # Frames arrive as permuted NHWC buffers, so warm up with the same channels-last strides
+                    warmup_pixels = torch.zeros((batch_size, 3, frame_size, frame_size), device=device, dtype=model.dtype)
+                    model.get_image_features(pixel_values=warmup_pixels.contiguous(memory_format=torch.channels_last))
+            except Exception as e:
+                # A missing or broken compiler toolchain (e.g. no Triton) only shows up on the first call,
+                # so go back to the eager vision tower for this and every later file
+                print(f"Compiling vision model failed, using eager inference: {type(e).__name__}: {str(e)}")
+                model.vision_model = model.vision_model._orig_mod
+                compiled_model = False
+        
+        # TensorRT builds an engine per input shape too, so ONNX Runtime gets the same fixed batch shape
+        pad_batches = compiled_model or isinstance(model, OnnxImageEncoder)
+        
+        # Collect the stills to compare against
         if force_still_path:
             if not os.path.exists(force_still_path):
                 print(f"ERROR: Forced still file not found: {force_still_path}")
@@ -398,7 +1066,7 @@ def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5,
             stills_to_process = 1 # Only one still to process
         else:
             # Get episode images from TMDB
-            episode_images = get_episode_images(file_info['tmdbId'], file_info['season'], file_info['episode'])
+            episode_images = episode_images_future.result()
             if not episode_images or 'stills' not in episode_images or len(episode_images['stills']) == 0:
                 print("No episode stills available from TMDB")
                 return False
@@ -406,91 +1074,201 @@ def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5,
             stills_to_process = min(len(stills_to_process_list), max_stills)
             print(f"Found {len(stills_to_process_list)} stills for episode from TMDB (will process up to {stills_to_process})")
 
+        # Work out where each still comes from, where it lives locally and where its embedding is cached
+        still_sources = []
+        still_cache_paths = {}
         for still_index, still_info in enumerate(stills_to_process_list[:stills_to_process]):
             if force_still_path:
                 still_path = still_info['file_path'] # This is already a local path
-                print(f"\nProcessing forced still #{still_index + 1} (Path: {still_path})")
+                still_sources.append((still_index + 1, None, still_path))
             else:
                 still_url = f"{TMDB_IMAGE_BASE_URL}{still_info['file_path']}"
-                # Prepare file path for this still
-                still_path = os.path.join(TEMP_DIR, f"{safe_dirname}_still_{still_index + 1}.jpg")
-                # Download the reference still
-                print(f"\nProcessing still #{still_index + 1} of {stills_to_process} (TMDB)")
-                if not download_image(still_url, still_path):
-                    print(f"Failed to download still: {still_url}")
-                    continue # Skip this still
-            
-            # Get embedding for the reference still
-            print(f"Getting embedding for still #{still_index + 1}...")
-            still_image = Image.open(still_path)
-            still_inputs = processor(images=still_image, return_tensors="pt")
+                # Named by URL rather than list position, so an existing file is always this exact still
+                still_path = os.path.join(TEMP_DIR, f"{safe_dirname}_still_{hashlib.sha1(still_url.encode()).hexdigest()[:16]}.jpg")
+                still_sources.append((still_index + 1, still_url, still_path))
+                still_cache_paths[still_index + 1] = still_cache_path(still_url, embedding_model_name)
+        
+        # Reuse cached embeddings so only stills missing from the cache are downloaded and embedded
+        embeddings_by_still = {}
+        for still_number, cache_path in still_cache_paths.items():
+            cached_embedding = load_cached_still_embedding(cache_path, still_cache_info)
+            if cached_embedding is not None:
+                embeddings_by_still[still_number] = cached_embedding
+        if embeddings_by_still:
+            print(f"Using cached embeddings for {len(embeddings_by_still)} of {len(still_sources)} stills")
+        missing_sources = [source for source in still_sources if source[0] not in embeddings_by_still]
+        
+        # Download the remaining TMDB stills in parallel
+        if force_still_path:
+            print(f"\nProcessing forced still #1 (Path: {force_still_path})")
+            available_paths = [force_still_path]
+        elif missing_sources:
+            print(f"\nDownloading {len(missing_sources)} stills from TMDB...")
+            with ThreadPoolExecutor(max_workers=min(8, len(missing_sources))) as executor:
+                available_paths = list(executor.map(lambda source: download_image(source[1], source[2]), missing_sources))
+        else:
+            available_paths = []
+        
+        # Embed all stills that were not cached in a single forward pass
+        downloaded_sources = []
+        for source, available_path in zip(missing_sources, available_paths):
+            if not available_path:
+                print(f"Failed to download still: {source[1]}")
+                continue # Skip this still
+            downloaded_sources.append(source)
+        
+        if downloaded_sources:
+            print(f"Getting embeddings for stills {', '.join(f'#{source[0]}' for source in downloaded_sources)}...")
+            still_images = [open_rgb_image(still_path, frame_size) for _, _, still_path in downloaded_sources]
+            still_inputs = processor(images=still_images, return_tensors="pt")
             
-            # Move inputs to device
-            still_inputs = {k: v.to(device) for k, v in still_inputs.items()}
+            # Move inputs to device, laid out channels-last like the frames so a compiled graph sees the same strides
+            still_pixels = still_inputs['pixel_values'].to(device, dtype=model.dtype).contiguous(memory_format=torch.channels_last)
             
-            with torch.no_grad():
-                still_embedding = model.get_image_features(**still_inputs).squeeze().cpu().numpy()
+            # Embed in frame-sized batches, padded like the frames so a compiled graph or TensorRT engine is reused
+            new_embeddings = []
+            with torch.inference_mode():
+                for start in range(0, still_pixels.shape[0], batch_size):
+                    still_batch = still_pixels[start:start + batch_size]
+                    still_count = still_batch.shape[0]
+                    if pad_batches and still_count < batch_size:
+                        still_batch = torch.cat([still_batch, still_batch.new_zeros((batch_size - still_count, *still_batch.shape[1:]))])
+                    new_embeddings.append(model.get_image_features(pixel_values=still_batch)[:still_count].float())
+            new_embeddings = torch.nn.functional.normalize(torch.cat(new_embeddings), dim=-1)
             
-            # Compare with video frames
-            print(f"Comparing still #{still_index + 1} with video frames...")
-            still_max_similarity = 0.0
-            still_best_match = None
+            for (still_number, still_url, still_path), still_embedding in zip(downloaded_sources, new_embeddings):
+                embeddings_by_still[still_number] = still_embedding
+                if still_number in still_cache_paths:
+                    save_cached_still_embedding(still_cache_paths[still_number], still_embedding, still_cache_info)
+        
+        # Keep the embedded stills in their TMDB order
+        still_numbers = []
+        still_urls = []
+        still_paths = []
+        still_embeddings = []
+        for still_number, still_url, still_path in still_sources:
+            if still_number in embeddings_by_still:
+                still_numbers.append(still_number)
+                still_urls.append(still_url)
+                still_paths.append(still_path)
+                still_embeddings.append(embeddings_by_still[still_number])
+        
+        if not still_embeddings:
+            print("Failed to embed any stills")
+            return False
+        
+        # Keep all still embeddings normalized on the device as a single (stills, dim) matrix
+        still_embeddings = torch.nn.functional.normalize(torch.stack(still_embeddings), dim=-1)
+        
+        # Embed every video frame exactly once, no matter how many stills there are
+        print(f"\nComparing {len(still_numbers)} stills with video frames...")
+        frame_embeddings = []
+        # Position of each embedded frame in the video, as near-duplicate frames are never embedded
+        frame_indices = []
+        still_running_max = torch.zeros(len(still_numbers), device=device)
+        
+        # Reuse the embeddings from an earlier full scan of this exact file and model
+        frame_cache = frame_cache_path(media_path, embedding_model_name, FRAME_RATE, keyframes_only, dedupe)
+        cached_frames = load_cached_embeddings(frame_cache)
+        stopped_early = False
+        if cached_frames is not None:
+            print(f"Using cached embeddings for {len(cached_frames['embeddings'])} frames")
+            frame_embeddings.append(cached_frames['embeddings'])
+            frame_indices = cached_frames['frame_indices'].tolist()
+        else:
+            # Frames are read into a small pool of reused host buffers, pinned on CUDA so uploads skip the staging copy.
+            # One buffer is being filled, up to PREFETCH_BATCHES are queued and one is being embedded
+            host_frames = [
+                torch.empty((batch_size, frame_size, frame_size, 3), dtype=torch.uint8, pin_memory=(device.type == 'cuda'))
+                for _ in range(PREFETCH_BATCHES + 2)
+            ]
+            upload_done = torch.cuda.Event() if device.type == 'cuda' else None
             
-            # Process frames in batches
-            BATCH_SIZE = 10
-            num_batches = (len(frame_paths) + BATCH_SIZE - 1) // BATCH_SIZE
+            # On CUDA, uploads run on their own stream so the next batch copies while the current one is embedded
+            copy_stream = torch.cuda.Stream() if device.type == 'cuda' else None
             
-            for i in range(num_batches):
-                batch = frame_paths[i * BATCH_SIZE:(i + 1) * BATCH_SIZE]
-                print(f"Processing frames {i * BATCH_SIZE + 1}-{min((i + 1) * BATCH_SIZE, len(frame_paths))} of {len(frame_paths)}...")
+            # Frames come straight from FFmpeg at the model's input size, with no JPEG round-trip through disk,
+            # and are decoded on a background thread while the previous batch is embedded
+            # Stopping early terminates FFmpeg immediately instead of waiting for it to fill another batch
+            stop_decoding = threading.Event()
+            decode_complete = threading.Event()
+            frame_batches = prefetch_batches(stream_frame_batches(media_path, host_frames, FRAME_RATE, keyframes_only, stop_decoding, dedupe, decode_complete), stop=stop_decoding)
+            try:
+                for frames, batch_indices in frame_batches:
+                    print(f"Processing frames {batch_indices[0] + 1}-{batch_indices[-1] + 1}...")
+                    if copy_stream is not None:
+                        with torch.cuda.stream(copy_stream):
+                            device_frames = frames.to(device, non_blocking=True)
+                            upload_done.record(copy_stream)
+                        # The forward must not start before its frames have landed, and their memory
+                        # must not be reused by the copy stream while the forward still reads it
+                        torch.cuda.current_stream().wait_stream(copy_stream)
+                        device_frames.record_stream(torch.cuda.current_stream())
+                    else:
+                        # Elsewhere the buffer is not pinned and nothing waits on an async copy before the decoder
+                        # refills it, so upload synchronously (on the CPU this is a no-op)
+                        device_frames = frames.to(device)
                 
-                batch_results = process_batch(batch, still_embedding, processor, model)
+                    batch_embeddings = process_batch(device_frames, model, pixel_mean, pixel_std, batch_size if pad_batches else None)
+                    frame_embeddings.append(batch_embeddings)
+                    frame_indices.extend(batch_indices)
                 
-                for result in batch_results:
-                    similarity = result["similarity"]
-                    frame_path = result["path"]
-                    
-                    if similarity > still_max_similarity:
-                        still_max_similarity = similarity
-                        still_best_match = frame_path
-                        print(f"New best match for still #{still_index + 1}: {similarity:.3f} (frame: {os.path.basename(frame_path)})")
-                    
-                    # Update global best match if this is better
-                    if similarity > max_similarity:
-                        max_similarity = similarity
-                        best_match_frame = frame_path
-                        best_match_still = still_index + 1
-                        best_match_still_path = still_path
-                        print(f"New overall best match: {similarity:.3f} (frame: {os.path.basename(frame_path)}, still: #{still_index + 1})")
-                        
-                        # Early stopping if we hit the early stop threshold
-                        if similarity >= early_stop_threshold:
-                            print(f"Early stopping at similarity {similarity:.3f} (≥ {early_stop_threshold})")
-                            # Break out of frame processing loop
-                            break
+                    # The host buffer goes back to the decoder once the next batch is taken, so on CUDA wait for its upload
+                    # to finish; other devices already copied it synchronously
+                    if upload_done is not None:
+                        upload_done.synchronize()
                 
-                # Early stopping after batch if we hit the threshold
-                if max_similarity >= early_stop_threshold:
-                    print(f"Early stopping processing of frames at similarity {max_similarity:.3f}")
-                    break
+                    # Early stopping once the best match (every still's best match in strict mode) is good enough.
+                    # This is the only per-batch device sync, so skip it entirely when early exit is off
+                    if early_exit:
+                        still_running_max = torch.maximum(still_running_max, (still_embeddings @ batch_embeddings.T).max(dim=1).values)
+                        best_so_far = (still_running_max.min() if strict_mode else still_running_max.max()).item()
+                        if best_so_far >= early_stop_threshold:
+                            print(f"Early stopping processing of frames at similarity {best_so_far:.3f} (≥ {early_stop_threshold})")
+                            stopped_early = True
+                            break
+            finally:
+                frame_batches.close()
+            
+            # Only a complete scan describes the whole video, so early-stopped or failed decodes are not cached
+            if frame_cache and frame_embeddings and not stopped_early and decode_complete.is_set():
+                save_cached_embeddings(frame_cache, {'embeddings': torch.cat(frame_embeddings), 'frame_indices': torch.tensor(frame_indices)})
+                prune_frame_cache()
+        
+        if not frame_embeddings:
+            print("Failed to extract frames from video")
+            return False
+        
+        # Score every still against every embedded frame with a single matrix product
+        similarities = still_embeddings @ torch.cat(frame_embeddings).T
+        still_max_similarities, still_best_indices = similarities.max(dim=1)
+        
+        # For strict mode, track matches for each still
+        still_matches = []
+        
+        for still_number, still_url, still_path, still_max_similarity, best_index in zip(
+                still_numbers, still_urls, still_paths, still_max_similarities.cpu().tolist(), still_best_indices.cpu().tolist()):
+            best_index = frame_indices[best_index]
+            still_best_match = f"frame-{best_index + 1:04d}.jpg"
+            print(f"Best match for still #{still_number}: {still_max_similarity:.3f} (frame: {still_best_match})")
             
-            # Store match for this still for strict mode
             still_matches.append({
-                "still_index": still_index + 1,
+                "still_index": still_number,
                 "max_similarity": still_max_similarity,
                 "best_match": still_best_match,
+                "best_match_index": best_index,
+                "still_url": still_url,
                 "still_path": still_path
             })
-            
-            # Create comparison image for this still
-            if still_best_match:
-                comparison_path = os.path.join(verify_path, f"still_{still_index + 1}_match.jpg")
-                create_comparison_image(still_path, still_best_match, comparison_path, still_max_similarity, file_info)
-            
-            # Early stopping if we hit the early stop threshold
-            if max_similarity >= early_stop_threshold:
-                print(f"Early stopping at still #{still_index + 1} - found match with similarity {max_similarity:.3f} (≥ {early_stop_threshold})")
-                break
+        
+        # Overall best match across all stills
+        best_still_match = max(still_matches, key=lambda match: match["max_similarity"])
+        max_similarity = best_still_match["max_similarity"]
+        best_match_frame = best_still_match["best_match"]
+        best_match_frame_index = best_still_match["best_match_index"]
+        best_match_still = best_still_match["still_index"]
+        best_match_still_path = best_still_match["still_path"]
+        print(f"Overall best match: {max_similarity:.3f} (frame: {best_match_frame}, still: #{best_match_still})")
         
         # Determine if this is a match based on mode
         if strict_mode:
@@ -507,10 +1285,31 @@ def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5,
         end_time = time.time()
         total_duration = end_time - start_time
         
+        # Create comparison images only now that all CLIP work is done. Only the overall best match is
+        # shown unless per-still verification was requested
+        compared_matches = still_matches if verify_all else [best_still_match]
+        frame_image_paths = {}
+        for match in compared_matches:
+            # Copies of matched frames, extracted once each
+            frame_index = match["best_match_index"]
+            if frame_index not in frame_image_paths:
+                frame_output_path = os.path.join(TEMP_DIR, f"{safe_dirname}_{match['best_match']}")
+                frame_image_paths[frame_index] = extract_frame(media_path, frame_index, frame_output_path, FRAME_RATE)
+            
+            # Stills embedded from the cache are only downloaded once they are actually shown
+            if match["still_url"] and not os.path.exists(match["still_path"]):
+                download_image(match["still_url"], match["still_path"])
+            
+            # Create comparison image for this still
+            if verify_all and frame_image_paths[frame_index]:
+                comparison_path = os.path.join(verify_path, f"still_{match['still_index']}_match.jpg")
+                create_comparison_image(match["still_path"], frame_image_paths[frame_index], comparison_path, match["max_similarity"], file_info)
+        
         # Create final verification image for the best match
-        if best_match_frame and best_match_still_path:
+        best_match_frame_path = frame_image_paths.get(best_match_frame_index)
+        if best_match_frame_path and best_match_still_path:
             final_comparison_path = os.path.join(verify_path, "best_match.jpg")
-            create_comparison_image(best_match_still_path, best_match_frame, final_comparison_path, max_similarity, file_info)
+            create_comparison_image(best_match_still_path, best_match_frame_path, final_comparison_path, max_similarity, file_info)
         
         print("\nResults:")
         print("---------")
@@ -522,7 +1321,7 @@ def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5,
         print(f"Best match: {max_similarity:.3f} (threshold: {threshold})")
         print(f"Match: {'✓ VERIFIED' if is_match else '✗ WRONG EPISODE'}")
         if best_match_frame:
-            print(f"Best matching frame: {os.path.basename(best_match_frame)}")
+            print(f"Best matching frame: {best_match_frame}")
             if best_match_still:
                 print(f"Best matching still: #{best_match_still}")
         print(f"Total processing time: {total_duration:.2f} seconds")
@@ -535,17 +1334,93 @@ def process_media_file(media_path, threshold=SIMILARITY_THRESHOLD, max_stills=5,
     
     except Exception as e:
         print(f"Error processing media file: {str(e)}")
-        traceback.print_exc()
+        # Failures are often expected (no stills, unparseable names), so only format the traceback when asked
+        if verbose:
+            traceback.print_exc()
+        return False
+
+class MatchRequestHandler(socketserver.StreamRequestHandler):
+    """Run one JSON match request against the already loaded model and reply with its exit code and output."""
+    def handle(self):
+        output, errors = io.StringIO(), io.StringIO()
+        request_line = self.rfile.readline()
+        if not request_line:
+            return # A connection probe (e.g. another server checking the socket) with no request
+        try:
+            request = json.loads(request_line)
+            # Relative output paths (temp/, verification/) resolve against the client's working directory
+            os.chdir(request.pop('cwd'))
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+                try:
+                    exit_code = 0 if process_media_file(**request) else 1
+                except Exception as e:
+                    print(f"ERROR: Unhandled exception in main execution: {type(e).__name__}: {str(e)}", file=sys.stderr)
+                    if request.get('verbose'):
+                        traceback.print_exc(file=sys.stderr)
+                    exit_code = 2
+        except Exception as e:
+            errors.write(f"ERROR: Invalid match request: {str(e)}\n")
+            exit_code = 2
+        reply = {'exit_code': exit_code, 'output': output.getvalue(), 'errors': errors.getvalue()}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+def clear_stale_socket(socket_path):
+    """Remove a socket left behind by a server that is gone, returning False if the path is in use or not a socket."""
+    if not os.path.lexists(socket_path):
+        return True
+    if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        print(f"ERROR: {socket_path} exists and is not a socket", file=sys.stderr)
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(socket_path)
+        print(f"ERROR: Another server is already listening on {socket_path}", file=sys.stderr)
         return False
+    except ConnectionRefusedError:
+        os.remove(socket_path)
+        return True
+
+def serve_requests(socket_path):
+    """Serve match requests over a Unix socket so the model is loaded once for many media files."""
+    if not clear_stale_socket(socket_path):
+        return False
+    with socketserver.UnixStreamServer(socket_path, MatchRequestHandler) as server:
+        print(f"Serving match requests on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+    return True
+
+def request_match(socket_path, request):
+    """Send a match request to a running server, returning its exit code or None if no server is reachable."""
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(json.dumps(dict(request, cwd=os.getcwd())).encode() + b"\n")
+            with client.makefile('rb') as reply_file:
+                reply = json.loads(reply_file.readline())
+    except (OSError, ValueError) as e:
+        print(f"Match server unavailable ({str(e)}), running in-process")
+        return None
+    print(reply['output'], end='')
+    print(reply['errors'], end='', file=sys.stderr)
+    return reply['exit_code']
 
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Match TV show episodes with stills')
-    parser.add_argument('media_path', help='Path to the media file')
+    parser.add_argument('media_path', nargs='?', help='Path to the media file')
     parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
                         help=f'Similarity threshold (default: {SIMILARITY_THRESHOLD})')
     parser.add_argument('--early-stop', type=float, default=EARLY_STOP_THRESHOLD,
-                        help=f'Early stopping threshold (default: {EARLY_STOP_THRESHOLD})')
+                        help=f'Early stopping threshold (default: {EARLY_STOP_THRESHOLD}, at least threshold + {EARLY_STOP_MARGIN})')
+    parser.add_argument('--no-early-stop', action='store_true',
+                        help='Scan every frame even after a strong match is found')
     parser.add_argument('--max-stills', type=int, default=5,
                         help='Maximum number of stills to use from TMDB')
     parser.add_argument('--strict', action='store_true',
@@ -554,11 +1429,38 @@ def main():
                         help='Force CPU mode even if GPU is available')
     parser.add_argument('--force-still', type=str, default=None,
                         help='Path to a specific still image to use, bypassing TMDB lookup for stills.')
-    parser.add_argument('--model-name', type=str, default="openai/clip-vit-large-patch14",
+    parser.add_argument('--model-name', type=str, default=DEFAULT_MODEL_NAME,
                         help='Name of the CLIP model to use from HuggingFace Transformers.')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help=f'Frames per CLIP forward pass (default: sized from free VRAM on CUDA, {BATCH_SIZES["mps"]} on MPS, {BATCH_SIZES["cpu"]} on CPU)')
+    parser.add_argument('--fp32', action='store_true',
+                        help='Run CLIP in full FP32 precision on GPUs instead of BF16/FP16')
+    parser.add_argument('--backend', choices=['torch', 'onnx', 'openvino'], default='torch',
+                        help='Run the CLIP image encoder with PyTorch, ONNX Runtime or OpenVINO (CPU only, in FP32); exported once, falls back to PyTorch if the runtime is missing')
+    parser.add_argument('--onnx', action='store_true',
+                        help='Shorthand for --backend onnx')
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help='Embed every sampled frame, even near-duplicates of the previous one')
+    parser.add_argument('--verify-all', action='store_true',
+                        help='Also save a comparison image for every still, not just the best match')
+    parser.add_argument('--int8', action='store_true',
+                        help='Quantize CLIP to int8 when running on the CPU, with PyTorch or --onnx (faster, slightly less precise)')
+    parser.add_argument('--keyframes-only', action='store_true',
+                        help='Only decode keyframes (much faster, but sampled frames may lag by up to one GOP)')
+    parser.add_argument('--compile', action='store_true',
+                        help='Compile the vision model with torch.compile (CUDA graphs on CUDA); faster per batch, but each new process pays the compile first')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print full tracebacks when processing fails')
+    parser.add_argument('--serve', type=str, default=None, metavar='SOCKET',
+                        help='Keep the model loaded and serve match requests on this Unix socket instead of matching a file')
+    parser.add_argument('--client', type=str, default=None, metavar='SOCKET',
+                        help='Send the match to a --serve process on this Unix socket, running in-process if none is reachable. '
+                             'The server\'s device is used, so --cpu only applies to the in-process fallback')
     
     # Parse arguments
     args = parser.parse_args()
+    if not args.media_path and not args.serve:
+        parser.error('media_path is required unless --serve is used')
     
     # Force CPU if specified
     global device
@@ -566,14 +1468,45 @@ def main():
         device = torch.device('cpu')
         print(f"Forcing CPU mode")
     
+    if args.serve:
+        sys.exit(0 if serve_requests(args.serve) else 2)
+    
+    # Paths are made absolute so a server in another directory resolves them the same way
+    request = {
+        'media_path': os.path.abspath(args.media_path),
+        'threshold': args.threshold,
+        'max_stills': args.max_stills,
+        'strict_mode': args.strict,
+        'early_stop_threshold': args.early_stop,
+        'force_still_path': os.path.abspath(args.force_still) if args.force_still else None,
+        'model_name_override': args.model_name,
+        'batch_size': args.batch_size,
+        'early_exit': not args.no_early_stop,
+        'half_precision': not args.fp32,
+        'keyframes_only': args.keyframes_only,
+        'backend': 'onnx' if args.onnx else args.backend,
+        'quantize_int8': args.int8,
+        'verify_all': args.verify_all,
+        'dedupe': not args.no_dedupe,
+        'compile_model': args.compile,
+        'verbose': args.verbose,
+    }
+    
+    # Hand the match to a running server if one was requested and is reachable
+    if args.client:
+        exit_code = request_match(args.client, request)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    
     # Process the media file with error handling
     try:
-        is_match = process_media_file(args.media_path, args.threshold, args.max_stills, args.strict, args.early_stop, args.force_still, args.model_name)
+        is_match = process_media_file(**request)
         # Exit with 0 if match, 1 if no match (standard non-error exit)
         sys.exit(0 if is_match else 1)
     except Exception as e:
-        print(f"ERROR: Unhandled exception in main execution: {str(e)}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr) # Print full traceback to stderr
+        print(f"ERROR: Unhandled exception in main execution: {type(e).__name__}: {str(e)}", file=sys.stderr)
+        if args.verbose:
+            traceback.print_exc(file=sys.stderr) # Print full traceback to stderr
         sys.exit(2) # Use a different exit code for unexpected errors
 
 if __name__ == '__main__':